@@ -1,44 +1,113 @@
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import threading
 from contextlib import contextmanager
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import ConnectionPool
 from config import Config
 from utils.logging_utils import set_custom_logger
 
 class Database:
     def __init__(self):
         self.logger = set_custom_logger()
-        self.connection = None
+        self.pool = None
+        # Connection pinned to the current thread by session(), if any
+        self._local = threading.local()
 
-    def connect(self):
-        try:
-            self.connection = psycopg2.connect(
-                host=Config.DATABASE_HOST,
-                database=Config.DATABASE_NAME,
-                user=Config.DATABASE_USER,
-                password=Config.DATABASE_PASSWORD,
-                port=Config.DATABASE_PORT
+    def _open_pool(self, timeout):
+        if self.pool is None or self.pool.closed:
+            self.pool = ConnectionPool(
+                conninfo=make_conninfo(
+                    host=Config.DATABASE_HOST,
+                    dbname=Config.DATABASE_NAME,
+                    user=Config.DATABASE_USER,
+                    password=Config.DATABASE_PASSWORD,
+                    port=Config.DATABASE_PORT
+                ),
+                min_size=2,
+                max_size=10,
+                kwargs={"autocommit": False},
+                open=False
             )
-            self.logger.info("Database connection established.")
+        self.pool.open(wait=True, timeout=timeout)
+
+    def connect(self, timeout=30.0):
+        try:
+            self._open_pool(timeout)
+            self.logger.info("Database connection pool established.")
         except Exception as e:
             self.logger.error(f"Error connecting to database: {e}")
             raise
 
+    def ping(self, timeout=2.0):
+        """
+        Opens the connection pool if needed and runs SELECT 1.
+        Failures are raised without being logged, so callers can retry quietly.
+
+        Args:
+            timeout (float): Seconds to wait for the pool and for a connection.
+        """
+        self._open_pool(timeout)
+        with self.pool.connection(timeout=timeout) as connection:
+            connection.execute("SELECT 1;")
+
+    @contextmanager
+    def session(self):
+        """
+        Pins one pooled connection to the current thread, so that every cursor() opened
+        inside the block shares the same database session (e.g. for TEMP tables).
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            yield connection
+            return
+
+        if self.pool is None or self.pool.closed:
+            self.connect()
+        with self.pool.connection() as connection:
+            self._local.connection = connection
+            try:
+                yield connection
+            finally:
+                self._local.connection = None
+
+    @contextmanager
+    def transaction(self):
+        """
+        Runs every cursor() opened inside the block in a single transaction on one pooled connection.
+        Each cursor() block becomes a savepoint, and the transaction commits when the block exits.
+        """
+        with self.session() as connection:
+            with connection.transaction():
+                yield connection
+
     @contextmanager
-    def cursor(self):
-        if self.connection is None:
+    def cursor(self, row_factory=None):
+        """
+        Yields a cursor in its own transaction (a savepoint inside transaction()).
+        Rows are plain tuples unless a psycopg row_factory is given.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            with self._cursor(connection, row_factory) as cursor:
+                yield cursor
+            return
+
+        if self.pool is None or self.pool.closed:
             self.connect()
-        cursor = self.connection.cursor(cursor_factory=RealDictCursor)
+        with self.pool.connection() as connection:
+            with self._cursor(connection, row_factory) as cursor:
+                yield cursor
+
+    @contextmanager
+    def _cursor(self, connection, row_factory):
         try:
-            yield cursor
-            self.connection.commit()
+            with connection.transaction():
+                with connection.cursor(row_factory=row_factory) as cursor:
+                    yield cursor
         except Exception as e:
-            self.connection.rollback()
             self.logger.error(f"Database operation failed: {e}")
             raise
-        finally:
-            cursor.close()
 
     def close(self):
-        if self.connection:
-            self.connection.close()
-            self.logger.info("Database connection closed.")
+        if self.pool:
+            self.pool.close()
+            self.logger.info("Database connection pool closed.")
@@ -1,7 +1,174 @@
-from psycopg2 import sql
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import csv as pa_csv
 from database import Database
 
 
+# Secondary indexes on the main table, each built in its own pooled session
+SECONDARY_INDEXES = [
+    "CREATE INDEX idx_transactions_created_at ON transactions(created_at);",
+    "CREATE INDEX idx_transactions_status ON transactions(status);",
+    "CREATE INDEX idx_transactions_agent_name ON transactions(agent_name);",
+    "CREATE INDEX idx_transactions_location ON transactions USING GIST (location);",
+    "CREATE INDEX idx_transactions_failed_grid_cell ON transactions (grid_cell) WHERE status = 'Failed';",
+    "CREATE INDEX idx_transactions_status_created_at ON transactions (status, created_at);",
+    "CREATE INDEX idx_transactions_success_created_at ON transactions (created_at) INCLUDE (agent_name, amount) WHERE status = 'Success';",
+    "CREATE INDEX idx_transactions_email ON transactions (email) INCLUDE (location, created_at);",
+]
+
+# CSV columns in staging_transactions order. All are read as text and passed through to COPY,
+# so the staging column types parse and round the numerics as before.
+CSV_SCHEMA = pa.schema([
+    (name, pa.string())
+    for name in (
+        "transaction_id", "agent_name", "amount", "status", "created_at",
+        "updated_at", "lat", "lon", "email", "phone_number",
+    )
+])
+
+# Bytes read from the CSV per Arrow batch, and number of batches parsed ahead of the COPY
+CSV_BLOCK_SIZE = 1 << 20
+PREFETCH_BATCHES = 4
+
+
+def _standardize_phone(phone_number):
+    """
+    Standardizes phone numbers to 10 digits, handling +91, 91 and 0 prefixes.
+    Only ASCII digits count, as with PostgreSQL's \\d under the libc UTF-8 locale.
+
+    Args:
+        phone_number (pa.Array): The raw phone numbers.
+
+    Returns:
+        pa.Array: The 10-digit phone numbers, null where a number is invalid.
+    """
+    digits = pc.replace_substring_regex(phone_number, pattern=r'[^0-9]', replacement='')
+    length = pc.utf8_length(digits)
+    null = pa.scalar(None, pa.string())
+    standardized = pc.if_else(
+        pc.match_substring_regex(phone_number, r'^\+?91'),
+        pc.if_else(pc.greater_equal(length, 12), pc.utf8_slice_codeunits(digits, 2, 12), null),
+        pc.if_else(
+            pc.starts_with(phone_number, '0'),
+            pc.if_else(pc.greater_equal(length, 11), pc.utf8_slice_codeunits(digits, 1, 11), null),
+            pc.if_else(pc.equal(length, 10), digits, null)
+        )
+    )
+    return pc.if_else(pc.match_substring_regex(standardized, r'^[6-9][0-9]{9}$'), standardized, null)
+
+
+def _standardize_email(email):
+    """
+    Standardizes emails to lowercase without surrounding spaces.
+    RE2's \\w is ASCII-only, so the Unicode classes matched by PostgreSQL's \\w are spelled out.
+
+    Args:
+        email (pa.Array): The raw emails.
+
+    Returns:
+        pa.Array: The standardized emails, null where an email is invalid.
+    """
+    standardized = pc.utf8_lower(pc.utf8_trim(email, characters=' '))
+    null = pa.scalar(None, pa.string())
+    return pc.if_else(pc.match_substring_regex(standardized, r'^[\p{L}\p{N}_.-]+@[\p{L}\p{N}_.-]+\.[\p{L}\p{N}_]+$'), standardized, null)
+
+
+def _read_valid_batches(csv_file_path):
+    """
+    Streams the CSV file as Arrow record batches, standardizing phone numbers and emails and
+    dropping the rows where either is invalid.
+
+    Args:
+        csv_file_path (str): Path to the CSV file to read.
+    """
+    reader = pa_csv.open_csv(
+        csv_file_path,
+        # Columns are matched by position, not header name, like COPY ... HEADER
+        read_options=pa_csv.ReadOptions(block_size=CSV_BLOCK_SIZE, column_names=CSV_SCHEMA.names, skip_rows=1),
+        convert_options=pa_csv.ConvertOptions(
+            column_types=CSV_SCHEMA,
+            # Match COPY's CSV NULL rules: only unquoted empty fields are NULL
+            null_values=[''],
+            strings_can_be_null=True,
+            quoted_strings_can_be_null=False
+        )
+    )
+    for batch in reader:
+        phone_number = _standardize_phone(batch.column("phone_number"))
+        email = _standardize_email(batch.column("email"))
+        columns = batch.columns[:-2] + [email, phone_number]
+        yield pa.RecordBatch.from_arrays(columns, schema=CSV_SCHEMA).filter(
+            pc.and_(pc.is_valid(email), pc.is_valid(phone_number))
+        )
+
+
+def _encode_csv(batch):
+    """
+    Encodes a record batch as headerless CSV for COPY, using Arrow's vectorized CSV writer.
+    Strings are quoted and NULLs are left as unquoted empty fields, matching COPY's CSV NULL rules.
+
+    Args:
+        batch (pa.RecordBatch): The rows to encode.
+
+    Returns:
+        memoryview: The encoded CSV bytes.
+    """
+    sink = pa.BufferOutputStream()
+    pa_csv.write_csv(batch, sink, write_options=pa_csv.WriteOptions(include_header=False))
+    return memoryview(sink.getvalue())
+
+
+def _prefetch(iterable, maxsize=PREFETCH_BATCHES):
+    """
+    Iterates over iterable in a background thread, keeping up to maxsize items ready for the consumer,
+    so producing the next item overlaps with consuming the current one.
+    Exceptions raised while producing are re-raised in the consumer.
+
+    Args:
+        iterable: The items to produce in the background.
+        maxsize (int): The maximum number of items buffered ahead of the consumer.
+    """
+    done = object()
+    buffer = queue.Queue(maxsize=maxsize)
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((done, None))
+        except Exception as e:
+            put((None, e))
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        stopped.set()
+        producer.join()
+
+
 class DataIngestion:
     def __init__(self, db: Database, csv_file_path: str):
         """
@@ -22,14 +189,16 @@ class DataIngestion:
         try:
             self.logger.info("Starting data ingestion process.")
 
-            # Load data into the staging table
-            self.load_data_to_staging()
+            # Load, validate and insert in one transaction, so the staging COPY can use FREEZE
+            with self.db.transaction():
+                # Load data into the staging table
+                self.load_data_to_staging()
 
-            # Ensure the main transactions table exists
-            self.create_transactions_table()
+                # Ensure the main transactions table exists
+                self.create_transactions_table()
 
-            # Validate and transform data, insert into main table
-            self.validate_and_transform()
+                # Validate and transform data, insert into main table
+                self.validate_and_transform()
 
             # Move invalid records to the error table (Skipped for now)
             # self.move_invalid_records_to_error_table()
@@ -48,13 +217,16 @@ class DataIngestion:
 
     def load_data_to_staging(self):
         """
-        Loads raw CSV data into the staging table using PostgreSQL's COPY command.
+        Loads CSV data into the UNLOGGED staging table using PostgreSQL's COPY command.
+        The CSV is parsed, validated and standardized client-side in Arrow batches, so only valid rows reach the database,
+        and each filtered batch is re-encoded as CSV by Arrow and streamed to COPY without building Python rows.
+        The table is truncated in the same transaction as the COPY, which lets it load frozen rows.
         """
         try:
             with self.db.cursor() as cursor:
                 # Create staging table
                 create_staging_table_query = """
-                CREATE TEMP TABLE staging_transactions (
+                CREATE UNLOGGED TABLE IF NOT EXISTS staging_transactions (
                     transaction_id VARCHAR(50),
                     agent_name VARCHAR(100),
                     amount NUMERIC(12,2),
@@ -68,15 +240,15 @@ class DataIngestion:
                 );
                 """
                 cursor.execute(create_staging_table_query)
-                self.logger.info("Staging table created.")
-
-                # Execute COPY command
-                with open(self.csv_file_path, 'r', encoding='utf-8') as f:
-                    cursor.copy_expert(
-                        sql.SQL("COPY staging_transactions FROM STDIN WITH (FORMAT csv, HEADER TRUE)"),
-                        f
-                    )
-                self.logger.info("Data loaded into staging table using COPY.")
+                cursor.execute("TRUNCATE staging_transactions;")
+                self.logger.info("Staging table created or truncated.")
+
+                # Execute COPY command with the validated and standardized rows
+                with cursor.copy("COPY staging_transactions FROM STDIN (FORMAT csv, FREEZE)") as copy:
+                    # Read, filter and encode the next batches in the background while this one is sent
+                    for chunk in _prefetch(_encode_csv(batch) for batch in _read_valid_batches(self.csv_file_path)):
+                        copy.write(chunk)
+                self.logger.info(f"Loaded {cursor.rowcount} valid records into staging table using COPY.")
         except Exception as e:
             self.logger.error(f"Error loading data to staging table: {e}")
             raise
@@ -84,12 +256,16 @@ class DataIngestion:
     def create_transactions_table(self):
         """
         Creates the main transactions table if it does not exist.
+        The primary key is added in create_indexes, after the bulk insert.
         """
         try:
             with self.db.cursor() as cursor:
+                # PostGIS is needed for the spatial index and the location queries
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS postgis;")
+
                 create_table_query = """
                 CREATE TABLE IF NOT EXISTS transactions (
-                    transaction_id VARCHAR(50) PRIMARY KEY,
+                    transaction_id VARCHAR(50) NOT NULL,
                     agent_name VARCHAR(100),
                     amount NUMERIC(12,2),
                     status VARCHAR(10),
@@ -98,7 +274,10 @@ class DataIngestion:
                     lat DECIMAL(9,6),
                     lon DECIMAL(9,6),
                     email VARCHAR(100),
-                    phone_number VARCHAR(20)
+                    phone_number VARCHAR(20),
+                    location GEOGRAPHY(Point, 4326) GENERATED ALWAYS AS (ST_SetSRID(ST_MakePoint(lon, lat), 4326)::geography) STORED,
+                    -- 1.5 degree grid cell used to group failed transactions by area
+                    grid_cell GEOMETRY(Point, 4326) GENERATED ALWAYS AS (ST_SnapToGrid(ST_SetSRID(ST_MakePoint(lon, lat), 4326), 1.5)) STORED
                 );
                 """
                 cursor.execute(create_table_query)
@@ -109,66 +288,44 @@ class DataIngestion:
 
     def validate_and_transform(self):
         """
-        Validates and transforms data from the staging table and inserts valid records into the main table.
+        Transforms and deduplicates the validated data from the staging table and inserts it into the main table.
         """
         try:
             with self.db.cursor() as cursor:
-                # Standardize and validate phone numbers
-                standardized_phone = """
-                    CASE 
-                        WHEN phone_number ~ '^\\+?91' THEN 
-                            CASE 
-                                WHEN LENGTH(regexp_replace(phone_number, '\\D', '', 'g')) >= 12 THEN SUBSTRING(regexp_replace(phone_number, '\\D', '', 'g') FROM 3 FOR 10)
-                                ELSE NULL
-                            END
-                        WHEN phone_number ~ '^0' THEN 
-                            CASE 
-                                WHEN LENGTH(regexp_replace(phone_number, '\\D', '', 'g')) >= 11 THEN SUBSTRING(regexp_replace(phone_number, '\\D', '', 'g') FROM 2 FOR 10)
-                                ELSE NULL
-                            END
-                        ELSE 
-                            CASE 
-                                WHEN LENGTH(regexp_replace(phone_number, '\\D', '', 'g')) = 10 THEN regexp_replace(phone_number, '\\D', '', 'g')
-                                ELSE NULL
-                            END
-                    END
+                # Rows were validated and standardized before the COPY, so this only transforms and deduplicates.
+                # MERGE skips transaction_ids already in the main table (requires PostgreSQL 15+).
+                insert_query = """
+                    MERGE INTO transactions t
+                    USING (
+                        -- Handling duplicate transaction_id: keep the latest update of each transaction
+                        SELECT DISTINCT ON (transaction_id)
+                            transaction_id,
+                            agent_name,
+                            amount,
+                            status,
+                            TO_TIMESTAMP(created_at, 'YYYY-MM-DD"T"HH24:MI:SS.US') AS created_at,
+                            TO_TIMESTAMP(updated_at, 'YYYY-MM-DD"T"HH24:MI:SS.US') AS updated_at,
+                            lat,
+                            lon,
+                            email,
+                            phone_number
+                        FROM
+                            staging_transactions
+                        ORDER BY
+                            transaction_id, updated_at DESC NULLS LAST
+                    ) s
+                    ON t.transaction_id = s.transaction_id
+                    WHEN NOT MATCHED THEN
+                        INSERT (
+                            transaction_id, agent_name, amount, status,
+                            created_at, updated_at, lat, lon, email, phone_number
+                        )
+                        VALUES (
+                            s.transaction_id, s.agent_name, s.amount, s.status,
+                            s.created_at, s.updated_at, s.lat, s.lon, s.email, s.phone_number
+                        );
                 """
 
-                # Standardize emails to lowercase and trim
-                standardized_email = "LOWER(TRIM(email))"
-
-                # Insert valid records into main table
-                insert_query = sql.SQL("""
-                    INSERT INTO transactions (
-                        transaction_id, agent_name, amount, status,
-                        created_at, updated_at, lat, lon, email, phone_number
-                    )
-                    SELECT
-                        transaction_id,
-                        agent_name,
-                        amount,
-                        status,
-                        TO_TIMESTAMP(created_at, 'YYYY-MM-DD"T"HH24:MI:SS.US'),
-                        TO_TIMESTAMP(updated_at, 'YYYY-MM-DD"T"HH24:MI:SS.US'),
-                        lat,
-                        lon,
-                        {standardized_email},
-                        {standardized_phone}
-                    FROM
-                        staging_transactions
-                    WHERE
-                        -- Validate phone number: exactly 10 digits starting with 6-9
-                        {standardized_phone} ~ '^[6-9]\\d{{9}}$'
-                        AND
-                        -- Validate email format
-                        {standardized_email} ~ '^[\\w\\.-]+@[\\w\\.-]+\\.\\w+$'
-                    -- Handling duplicate transaction_id
-                    ON CONFLICT (transaction_id) DO NOTHING;
-                """).format(
-                    standardized_email=sql.SQL(standardized_email),
-                    standardized_phone=sql.SQL(standardized_phone)
-                )
-
                 cursor.execute(insert_query)
                 inserted = cursor.rowcount
                 self.logger.info(f"Inserted {inserted} valid records into main table.")
@@ -240,24 +397,40 @@ class DataIngestion:
 
     def create_indexes(self):
         """
-        Creates indexes on the main table after bulk data insertion for efficient querying.
+        Creates the primary key and indexes on the main table after bulk data insertion for efficient querying.
+        The secondary indexes are built concurrently on separate pooled connections, so their heap scans overlap.
         """
         try:
-            #may create spatial index on location, skipped for now
             with self.db.cursor() as cursor:
+                # Give the btree build enough memory and parallel workers for the sort
                 cursor.execute("""
-                    CREATE INDEX idx_transactions_created_at ON transactions(created_at);
-                    CREATE INDEX idx_transactions_status ON transactions(status);
-                    CREATE INDEX idx_transactions_agent_name ON transactions(agent_name);
-                    CREATE INDEX idx_transactions_lat_lon ON transactions(lat, lon);
-                    CREATE INDEX idx_transactions_status_created_at ON transactions (status, created_at);
-                    CREATE INDEX idx_transactions_email ON transactions (email);
+                    SET LOCAL maintenance_work_mem = '1GB';
+                    SET LOCAL max_parallel_maintenance_workers = 4;
+                    ALTER TABLE transactions ADD PRIMARY KEY (transaction_id);
                 """)
-                self.logger.info("Indexes created.")
+                self.logger.info("Primary key created.")
+
+            # CREATE INDEX takes a SHARE lock, which does not conflict with other index builds on the same table
+            with ThreadPoolExecutor(max_workers=len(SECONDARY_INDEXES)) as executor:
+                futures = [executor.submit(self._create_index, statement) for statement in SECONDARY_INDEXES]
+                for future in futures:
+                    future.result()
+            self.logger.info("Indexes created.")
         except Exception as e:
             self.logger.error(f"Error recreating indexes: {e}")
             raise
 
+    def _create_index(self, statement):
+        """
+        Builds a single index in its own pooled session.
+
+        Args:
+            statement (str): The CREATE INDEX statement to execute.
+        """
+        with self.db.cursor() as cursor:
+            cursor.execute("SET LOCAL maintenance_work_mem = '512MB';")
+            cursor.execute(statement)
+
     def clean_up_staging(self):
         """
         Cleans up the staging table by truncating it.
@@ -1,4 +1,7 @@
+import signal
+import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 from queries import FraudDetection
 from config import Config
@@ -7,11 +10,43 @@ from ingestion import DataIngestion
 from utils.logging_utils import set_custom_logger
 
 
+def _wait_for_db(db, timeout=30):
+    """
+    Connects to the database, retrying with exponential backoff until it answers SELECT 1.
+    Retries are logged as warnings; only the final failure is logged as an error.
+
+    Args:
+        db (Database): The Database instance to connect.
+        timeout (float): Seconds to keep retrying before re-raising the last error.
+    """
+    deadline = time.monotonic() + timeout
+    delay = 0.1
+    while True:
+        try:
+            db.ping(timeout=2.0)
+            db.logger.info("Database connection pool established.")
+            return
+        except Exception as e:
+            if time.monotonic() > deadline:
+                db.logger.error(f"Database not ready after {timeout} seconds: {e}")
+                raise
+            db.logger.warning(f"Database not ready, retrying in {delay:.1f} seconds: {e}")
+            time.sleep(delay)
+            delay = min(delay * 2, 2.0)
+
+
+def _handle_sigterm(signum, frame):
+    """
+    Exits normally on SIGTERM (e.g. docker stop), so buffered log records are flushed at exit.
+    """
+    sys.exit(128 + signum)
+
+
 def main():
-    time.sleep(20)  # can add retry mechanism for postgres instance
+    signal.signal(signal.SIGTERM, _handle_sigterm)
     logger = set_custom_logger()
     db = Database()
-    db.connect()
+    _wait_for_db(db)
 
     # Initialize DataIngestion with the database instance and CSV file path
     ingestion = DataIngestion(db, Config.CSV_FILE_PATH)
@@ -20,23 +55,29 @@ def main():
     queries = FraudDetection(db)
     logger.info("Starting queries.")
 
+    # The queries are independent, so run them at the same time on separate pooled connections
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        users_multiple_locs_future = executor.submit(queries.users_multiple_locations)
+        failed_txn_future = executor.submit(queries.failed_transactions_by_location, threshold=2)
+        top_agents_future = executor.submit(queries.top_agents_past_year, limit=50)
+
     # 1. Users Transacting from Multiple Locations or far locations
-    users_multiple_locs = queries.users_multiple_locations()
+    users_multiple_locs = users_multiple_locs_future.result()
     logger.info(f"Users with multiple locations: {len(users_multiple_locs)}")
     for user in users_multiple_locs[:10]:
-        logger.info(f"Email: {user['email']}, Max Distance (meters): {user['max_distance_meters']}")
+        logger.info(f"Email: {user.email}, Max Distance (meters): {user.max_distance_meters}")
 
     # 2. Failed Transactions by Location with minimum 2 failures
-    failed_txn = queries.failed_transactions_by_location(threshold=2)
+    failed_txn = failed_txn_future.result()
     logger.info(f"Failed transactions exceeding threshold: {len(failed_txn)}")
     for record in failed_txn[:10]:
-        logger.info(f"Grid Latitude: {record['grid_lat']}, Grid Longitude: {record['grid_lon']}, Failed Transactions: {record['failed_transaction_count']}")
+        logger.info(f"Grid Latitude: {record.grid_lat}, Grid Longitude: {record.grid_lon}, Failed Transactions: {record.failed_transaction_count}")
 
     # 3. Top 50 Agents in the Past Year (Output: 0 for past week)
-    top_agents = queries.top_agents_past_year(limit=50)
+    top_agents = top_agents_future.result()
     logger.info(f"Top {len(top_agents)} agents by transaction amount in the past year:")
     for agent in top_agents:
-        logger.info(f"Agent Name: {agent['agent_name']}, Total Amount: {agent['total_transaction_amount']}")
+        logger.info(f"Agent Name: {agent.agent_name}, Total Amount: {agent.total_transaction_amount}")
 
     logger.info("Queries completed.")
 
@@ -1,45 +1,112 @@
-import logging
+from psycopg.rows import namedtuple_row
 from database import Database
 
+# Parallel workers per Gather node for the analytic scans and aggregates
+MAX_PARALLEL_WORKERS_PER_GATHER = 4
+
+# Analytic queries are executed with prepare=True, so each pooled connection
+# parses and plans them once and reuses the server-side prepared statement.
+
+USERS_MULTIPLE_LOCATIONS_QUERY = """
+    -- The diagonal of a user's bounding box bounds the distance between any two of their points,
+    -- so a single GROUP BY pass discards users who cannot exceed the threshold before the self-join.
+    WITH candidate_users AS (
+        SELECT
+            email
+        FROM
+            transactions
+        GROUP BY
+            email
+        HAVING
+            ST_Distance(
+                ST_SetSRID(ST_MakePoint(MIN(lon), MIN(lat)), 4326)::geography,
+                ST_SetSRID(ST_MakePoint(MAX(lon), MAX(lat)), 4326)::geography
+            ) > 5000
+    )
+    SELECT
+        ut1.email,
+        MAX(ST_Distance(ut1.location, ut2.location)) AS max_distance_meters
+    FROM
+        candidate_users cu
+    JOIN
+        transactions ut1
+        ON ut1.email = cu.email
+    JOIN
+        transactions ut2
+        ON ut1.email = ut2.email
+        AND ut1.created_at < ut2.created_at
+    GROUP BY
+        ut1.email
+    HAVING
+        MAX(ST_Distance(ut1.location, ut2.location)) > 5000  -- Threshold in meters (5 km)
+    ORDER BY
+        max_distance_meters DESC;
+"""
+
+FAILED_TRANSACTIONS_BY_LOCATION_QUERY = """
+    SELECT
+        ST_Y(grid_point) AS grid_lat,
+        ST_X(grid_point) AS grid_lon,
+        failed_transaction_count
+    FROM (
+        SELECT
+            grid_cell,
+            COUNT(*) AS failed_transaction_count
+        FROM
+            transactions
+        WHERE
+            status = 'Failed'
+        GROUP BY
+            grid_cell
+        HAVING
+            COUNT(*) > %s
+    ) failed_cells
+    -- Reproject each grid cell once for both coordinates
+    CROSS JOIN LATERAL (
+        SELECT ST_Transform(failed_cells.grid_cell, 4326) AS grid_point
+    ) projected
+    ORDER BY
+        failed_transaction_count DESC;
+"""
+
+TOP_AGENTS_PAST_YEAR_QUERY = """
+    SELECT
+        agent_name,
+        SUM(amount) AS total_transaction_amount
+    FROM
+        transactions
+    WHERE
+        status = 'Success'
+        AND created_at >= NOW() - INTERVAL '365 days' -- No results for past week
+    GROUP BY
+        agent_name
+    ORDER BY
+        total_transaction_amount DESC
+    LIMIT
+        %s;
+"""
+
+
 class FraudDetection:
     def __init__(self, db: Database):
-        self.logger = logging.getLogger(__name__)
         self.db = db
+        self.logger = self.db.logger
+
+    def _configure_session(self, cursor):
+        """
+        Applies the analytic session settings to the current transaction of a pooled connection.
+        """
+        cursor.execute(f"SET LOCAL max_parallel_workers_per_gather = {MAX_PARALLEL_WORKERS_PER_GATHER};")
 
     def users_multiple_locations(self):
         """
         Identify users who have transactions from multiple unknown or far locations considering 5km as threshold
         distance.
         """
-        query = """
-        CREATE EXTENSION IF NOT EXISTS postgis;
-        WITH user_transactions AS (
-            SELECT
-                email,
-                created_at,
-                ST_SetSRID(ST_MakePoint(lon, lat), 4326)::geography AS location
-            FROM
-                transactions
-        )
-        SELECT
-            ut1.email,
-            MAX(ST_Distance(ut1.location, ut2.location)) AS max_distance_meters
-        FROM
-            user_transactions ut1
-        JOIN
-            user_transactions ut2
-            ON ut1.email = ut2.email
-            AND ut1.created_at < ut2.created_at
-        GROUP BY
-            ut1.email
-        HAVING
-            MAX(ST_Distance(ut1.location, ut2.location)) > 5000  -- Threshold in meters (5 km)
-        ORDER BY
-            max_distance_meters DESC;
-        """
         try:
-            with self.db.cursor() as cursor:
-                cursor.execute(query)
+            with self.db.cursor(row_factory=namedtuple_row) as cursor:
+                self._configure_session(cursor)
+                cursor.execute(USERS_MULTIPLE_LOCATIONS_QUERY, prepare=True)
                 results = cursor.fetchall()
                 self.logger.info("Retrieved users transacting from multiple unknown or far locations.")
                 return results
@@ -51,38 +118,10 @@ class FraudDetection:
         """
         Detect transactions failing from specific locations or areas using grid cells.
         """
-        query = """
-        -- Ensure PostGIS extension is enabled
-        CREATE EXTENSION IF NOT EXISTS postgis;
-
-        WITH failed_transactions AS (
-            SELECT
-                ST_SetSRID(ST_MakePoint(lon, lat), 4326)::geography AS location
-            FROM
-                transactions
-            WHERE
-                status = 'Failed'
-        )
-        SELECT
-            ST_Y(ST_Transform(grid_cell, 4326)) AS grid_lat,
-            ST_X(ST_Transform(grid_cell, 4326)) AS grid_lon,
-            COUNT(*) AS failed_transaction_count
-        FROM (
-            SELECT
-                ST_SnapToGrid(location::geometry, 1.5) AS grid_cell
-            FROM
-                failed_transactions
-        ) sub
-        GROUP BY
-            grid_cell
-        HAVING
-            COUNT(*) > %s
-        ORDER BY
-            failed_transaction_count DESC;
-        """
         try:
-            with self.db.cursor() as cursor:
-                cursor.execute(query, (threshold,))
+            with self.db.cursor(row_factory=namedtuple_row) as cursor:
+                self._configure_session(cursor)
+                cursor.execute(FAILED_TRANSACTIONS_BY_LOCATION_QUERY, (threshold,), prepare=True)
                 results = cursor.fetchall()
                 self.logger.info(f"Retrieved locations with failed transactions exceeding threshold of {threshold}.")
                 return results
@@ -94,25 +133,10 @@ class FraudDetection:
         """
         List the top agents based on their transaction amounts within the past year.
         """
-        query = """
-        SELECT
-            agent_name,
-            SUM(amount) AS total_transaction_amount
-        FROM
-            transactions
-        WHERE
-            status = 'Success'
-            AND created_at >= NOW() - INTERVAL '365 days' -- No results for past week
-        GROUP BY
-            agent_name
-        ORDER BY
-            total_transaction_amount DESC
-        LIMIT
-            %s;
-        """
         try:
-            with self.db.cursor() as cursor:
-                cursor.execute(query, (limit,))
+            with self.db.cursor(row_factory=namedtuple_row) as cursor:
+                self._configure_session(cursor)
+                cursor.execute(TOP_AGENTS_PAST_YEAR_QUERY, (limit,), prepare=True)
                 results = cursor.fetchall()
                 self.logger.info(f"Retrieved top {limit} agents based on transaction amounts in the past week.")
                 return results
@@ -1,11 +1,45 @@
 import os
 import logging
+import logging.handlers
+
+LOGGER = None
+
+
+class _BatchFileHandler(logging.FileHandler):
+    """
+    FileHandler that does not flush its stream after every record; flush_batch() does it once per batch.
+    """
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+
+class _BatchMemoryHandler(logging.handlers.MemoryHandler):
+    """
+    MemoryHandler that flushes its target's stream once after handing it the buffered records.
+    """
+    def flush(self):
+        super().flush()
+        with self.lock:
+            if self.target:
+                self.target.flush_batch()
+
 
 def set_custom_logger():
     global LOGGER
 
-    LOGGER = logging.getLogger(__name__)
-    LOGGER.setLevel(logging.INFO)
+    # Handlers are attached once; later callers share the configured logger
+    if LOGGER is not None:
+        return LOGGER
+
+    logger = logging.getLogger(__name__)
+    if logger.handlers:
+        LOGGER = logger
+        return LOGGER
+
+    logger.setLevel(logging.INFO)
     module_name = __name__.replace('.', '_')
     log_path = f'logs/{module_name}_log.txt'
 
@@ -16,9 +50,13 @@ def set_custom_logger():
     consoleHandler = logging.StreamHandler()
     consoleHandler.setLevel(logging.ERROR)
 
-    fileHandler = logging.FileHandler(log_path, mode='w')
+    fileHandler = _BatchFileHandler(log_path, mode='w', delay=True)
     fileHandler.setLevel(logging.INFO)
 
+    # Buffer records and flush the file once per batch of 1024 records, on errors, and on exit
+    memoryHandler = _BatchMemoryHandler(capacity=1024, flushLevel=logging.ERROR, target=fileHandler)
+    memoryHandler.setLevel(logging.INFO)
+
     formatter = logging.Formatter(
         '%(asctime)s %(levelname)s File_name: %(filename)s Function_name: %(funcName)s Line_no: %(lineno)d Message: %(message)s',
         datefmt='%d/%m/%Y %I:%M:%S %p'
@@ -26,7 +64,8 @@ def set_custom_logger():
     consoleHandler.setFormatter(formatter)
     fileHandler.setFormatter(formatter)
 
-    LOGGER.addHandler(fileHandler)
-    LOGGER.addHandler(consoleHandler)
+    logger.addHandler(memoryHandler)
+    logger.addHandler(consoleHandler)
 
+    LOGGER = logger
     return LOGGER